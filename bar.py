@@ -8,43 +8,76 @@ import numpy as np
 class Bar:
 	"""A two-node bar element
 	Args:
-	Y: Young's modulus (Pa)
+	truss: Parent Truss object storing the bar's parameters & properties
+	index: Index of the bar within the truss' elements
+
+	Bar parameters, properties, internal forces & stresses are stored as
+	contiguous arrays on the parent truss; a Bar is a lightweight view of them:
+	Youngs: Young's modulus (Pa)
 	density: Density (kg m^-3)
 	area: Cross-sectional area (m^2)
-	position: Positions of the two nodes (m)
+	positions: Positions of the two nodes (m)
+	span: Vector from the first to the second node (m)
+	length: Bar length (m)
+	weight: Bar weight (kg)
+	stiffness: 6x6 element stiffness matrix (N m^-1)
+	force: Internal force (N)
+	stress: Internal stress (Pa)
 	"""
 
-	def __init__(self, Youngs, density, area, positions):
+	__slots__ = ("truss", "index")
 
-		# Assign bar parameters
-		self.Youngs = Youngs
-		self.density = density
-		self.area = area
-		self.positions = positions
+	def __init__(self, truss, index):
+		self.truss = truss
+		self.index = index
 
-		# Initialize internal forces & stresses
-		self.force = 0
-		self.stress = 0
+	@property
+	def Youngs(self):
+		return self.truss.Youngs[self.index]
+
+	@property
+	def density(self):
+		return self.truss.densities[self.index]
+
+	@property
+	def area(self):
+		return self.truss.areas[self.index]
+
+	@property
+	def positions(self):
+		return self.truss.element_positions[self.index]
+
+	@property
+	def span(self):
+		return self.truss.spans[self.index]
+
+	@property
+	def length(self):
+		return self.truss.lengths[self.index]
 
-		# Compute bar properties
-		try:
+	@property
+	def weight(self):
+		return self.truss.weights[self.index]
 
-			#
-			self.span = self.positions[1] - self.positions[0]
+	@property
+	def stiffness(self):
+		return self.truss.stiffness_stack[self.index]
 
-			#
-			self.length = (self.span @ self.span)**.5
+	@property
+	def force(self):
+		return self.truss.forces_el[self.index]
 
-			#
-			self.weight = self.length * self.area * self.density
+	@force.setter
+	def force(self, value):
+		self.truss.forces_el[self.index] = value
 
-			#
-			C = self.Youngs * self.area / self.length**3
-			sub = np.outer(self.span, self.span)
-			self.stiffness = C * np.block([[sub, -sub], [-sub, sub]])
+	@property
+	def stress(self):
+		return self.truss.stresses_el[self.index]
 
-		except TypeError:
-			self.log.error()
+	@stress.setter
+	def stress(self, value):
+		self.truss.stresses_el[self.index] = value
 
 	def apply_disp(self, disps):
 		"""Applies displacements to computing internal forces & stresses
@@ -54,7 +87,8 @@ class Bar:
 		"""
 
 		# 
-		dL = np.array([disps[i+3] - disps[i] for i in range(3)])
+		disps = np.asarray(disps)
+		dL = disps[3:] - disps[:3]
 		C = self.Youngs * self.area / self.length**2
 
 		#
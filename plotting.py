@@ -10,6 +10,7 @@ Modules:
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap as LSCM
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 
 def plot_struct(truss, label_nodes=True):
 	"""Plots a graphical representation of a truss structure
@@ -20,9 +21,9 @@ def plot_struct(truss, label_nodes=True):
 		label_nodes: (default True)
 	"""
 
-	# Copy useful quantities from the truss & its elements
-	node_positions = truss.node_positions.copy()
-	max_dim = 1.1 * abs(node_positions).max()
+	# Gather useful quantities from the truss & its elements
+	node_positions = truss.node_positions
+	max_dim = truss.max_dim
 
 	# Initialize the figure
 	fig = plt.figure(figsize=(7,5))
@@ -33,15 +34,16 @@ def plot_struct(truss, label_nodes=True):
 		ax.set_major_formatter(lambda x, pos: "{:.0f} m".format(x))
 	ax3d.grid(False)
 
-	# Plot & label points for nodes if so indicated, plot lines for bar elements
+	# Plot & label points for nodes if so indicated, plot lines for bar elements;
+	# the bars are a single collection, so layer nodes & labels above it explicitly
+	ax3d.computed_zorder = False
 	if label_nodes:
 		ax3d.scatter(node_positions[:,0], node_positions[:,1], node_positions[:,2],
-			color=[.95, .66, 0, 1.0], alpha=1, s=200)
+			color=[.95, .66, 0, 1.0], alpha=1, s=200, zorder=2)
 		for i in range(truss.num_nodes):
 			ax3d.text(node_positions[i,0], node_positions[i,1], node_positions[i,2],str(i+1),
-				color="k",ha="center",va="center",fontsize=12)
-	for el in truss.elements:
-		ax3d.plot(el.positions[:,0],el.positions[:,1],el.positions[:,2],'k-',lw=4)
+				color="k",ha="center",va="center",fontsize=12,zorder=3)
+	ax3d.add_collection3d(Line3DCollection(truss.element_positions, colors='k', linewidths=4, zorder=1))
 	
 	# Configure remaining plot settings
 	ax3d.set_xlim(-max_dim, max_dim)
@@ -63,9 +65,9 @@ def plot_disps(truss, magnify=10.):
 		magnify: Magnification factor applied to displacements (default 10.)
 	"""
 
-	# Copy useful quantities from the truss & its elements
-	node_positions = truss.node_positions.copy()
-	max_dim = 1.1 * abs(node_positions).max()
+	# Gather useful quantities from the truss & its elements
+	node_positions = truss.node_positions
+	max_dim = truss.max_dim
 	mag_disps = magnify * truss.displacements.reshape(truss.num_nodes,3)
 	disp_positions = node_positions + mag_disps
 
@@ -78,19 +80,20 @@ def plot_disps(truss, magnify=10.):
 		ax.set_major_formatter(lambda x, pos: "{:.0f} m".format(x))
 	ax3d.grid(False)
 
-	# Plot points & lines for nodes & bar elements (regular & displaced)
+	# Plot points & lines for nodes & bar elements (regular & displaced); the
+	# bars are single collections, so layer the displaced truss above the regular one
+	ax3d.computed_zorder = False
+	ePos = truss.element_positions
+	dePos = ePos + mag_disps[truss.element_nodes]
+	ax3d.add_collection3d(Line3DCollection(ePos, colors=[.9, .9, .9, 1.0], linewidths=4, alpha=0.75, zorder=1))
 	ax3d.scatter(
 		node_positions[:,0], node_positions[:,1], node_positions[:,2],
-		color=[.9, .9, .9, 1.0], alpha=0.75, s=100
+		color=[.9, .9, .9, 1.0], alpha=0.75, s=100, zorder=2
 	)
-	for e in range(truss.num_elements):
-		ePos = truss.elements[e].positions.reshape(len(truss.element_nodes[e]),3)
-		dePos = ePos + mag_disps[truss.element_nodes[e]]
-		ax3d.plot(ePos[:,0], ePos[:,1], ePos[:,2], '-', color=[.9, .9, .9, 1.0], lw=4, alpha=0.75)
-		ax3d.plot(dePos[:,0], dePos[:,1], dePos[:,2], '-', color='k', lw=4)
+	ax3d.add_collection3d(Line3DCollection(dePos, colors='k', linewidths=4, zorder=3))
 	ax3d.scatter(
 		disp_positions[:,0], disp_positions[:,1], disp_positions[:,2], 
-		color='k', alpha=1, s=100
+		color='k', alpha=1, s=100, zorder=4
 	)
 
 	# Configure remaining plot settings
@@ -121,20 +124,22 @@ def plot_stress(truss, stress_units="MPa"):
 		raise ValueError("'stress_units' must be one of: " + ", ".join(units))
 
 	# Define a color mapping function and Scalar Mappable object
-	def stress_color(stress,max_stress):
-		R = 1-min(abs(stress / max_stress),1) * (stress<0)
-		G = 1-min(abs(stress / max_stress),1)
-		B = 1-min(abs(stress / max_stress),1) * (stress>0)
-		return np.array([R,G,B])
-	stress_cs = [stress_color(i-5, 5) for i in range(11)]
+	def stress_colors(stresses, max_stress):
+		r = np.minimum(abs(stresses / max_stress), 1)
+		R = 1 - r * (stresses<0)
+		G = 1 - r
+		B = 1 - r * (stresses>0)
+		return np.stack([R,G,B], axis=1)
+	stress_cs = stress_colors(np.arange(11) - 5, 5)
 	stress_map = LSCM.from_list('stress_map', stress_cs, N=1e3)
 	stress_vals = plt.cm.ScalarMappable(None, stress_map)
 
-	# Copy useful quantities from the truss & its elements
-	node_positions = truss.node_positions.copy()
-	el_stresses = np.array([el.stress for el in truss.elements]) / unit
-	max_dim = 1.1 * abs(node_positions).max()
+	# Gather useful quantities from the truss & its elements
+	node_positions = truss.node_positions
+	el_stresses = truss.stresses_el / unit
+	max_dim = truss.max_dim
 	max_stress = abs(el_stresses).max()
+	el_colors = stress_colors(el_stresses, max_stress)
 
 	# Initialize the figure
 	fig = plt.figure(figsize=(7,5))
@@ -145,12 +150,8 @@ def plot_stress(truss, stress_units="MPa"):
 		ax.set_major_formatter(lambda x, pos: "{:.0f} m".format(x))
 	ax3d.grid(False)
 
-	# Plot lines for each bar element
-	for el in truss.elements:
-		ax3d.plot(
-			el.positions[:,0], el.positions[:,1], el.positions[:,2], 
-			'-', color=stress_color(el.stress / unit, max_stress), lw=4
-		)
+	# Plot lines for all bar elements as a single collection
+	ax3d.add_collection3d(Line3DCollection(truss.element_positions, colors=el_colors, linewidths=4))
 
 	# Create a color bar for indicating stress values
 	cbar = fig.colorbar(stress_vals, ax=ax3d, shrink=.5, pad=.1)
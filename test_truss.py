@@ -0,0 +1,152 @@
+"""
+test_truss.py
+Checks the Truss assembly & solve paths against dense reference computations
+for the example problem in truss-me.ipynb
+"""
+
+import numpy as np
+import pytest
+
+import truss as truss_module
+from truss import Truss
+
+# Define the example truss (see truss-me.ipynb)
+rNodes = 1e-2 * np.array([
+    [-95.25, 0., 508],
+    [95.25, 0., 508],
+    [-95.25, 95.25, 254],
+    [95.25, 95.25, 254],
+    [95.25, -95.25, 254],
+    [-95.25, -95.25, 254],
+    [-254., 254, 0],
+    [254., 254, 0],
+    [254., -254, 0],
+    [-254., -254, 0]
+])
+eNodes = np.array([
+    [0,1], [0,3], [1,2], [0,4], [1,5],
+    [1,3], [1,4], [0,2], [0,5], [2,5],
+    [3,4], [2,3], [4,5], [2,9], [5,6],
+    [3,8], [4,7], [3,6], [2,7], [4,9],
+    [5,8], [5,9], [2,6], [4,8], [3,7],
+])
+elAs = 1e-4 * np.array([
+    .213, 13, 13, 13, 13,
+    18.213, 18.213, 18.213, 18.213, 0.065,
+    0.065, 0.09, 0.09, 6.323, 6.323,
+    6.323, 6.323, 11.355, 11.355, 11.355,
+    11.355, 15.742, 15.742, 15.742, 15.742,
+])
+elYs = np.full(len(eNodes), 6.89e10)
+elDens = np.full(len(eNodes), 2.7e3)
+
+# Fix the four base nodes & load the upper ones
+DOF = np.ones(3*len(rNodes), dtype=int)
+DOF[18:] = 0
+nFs = np.zeros((len(rNodes), 3))
+nFs[[0, 1, 2, 5]] = [
+    [4448.222, 44482.216, -22241.108],
+    [0., 44482.216, -22241.108],
+    [2224.111, 0., 0.],
+    [2224.111, 0., 0.]
+]
+nFs = nFs.flatten()
+
+def make_truss():
+    return Truss(elYs, elDens, elAs, rNodes, eNodes)
+
+def dense_reference(DOF=DOF, forces=nFs):
+    """Assembles the global stiffness & solves for displacements densely"""
+    K = np.zeros((3*len(rNodes), 3*len(rNodes)))
+    for e, (n0, n1) in enumerate(eNodes):
+        span = rNodes[n1] - rNodes[n0]
+        length = np.linalg.norm(span)
+        sub = elYs[e] * elAs[e] / length**3 * np.outer(span, span)
+        Ke = np.block([[sub, -sub], [-sub, sub]])
+        dofs = np.r_[3*n0:3*n0+3, 3*n1:3*n1+3]
+        K[np.ix_(dofs, dofs)] += Ke
+    free = DOF != 0
+    u = np.zeros(3*len(rNodes))
+    u[free] = np.linalg.solve(K[np.ix_(free, free)], forces[free])
+    return K, u, K @ u
+
+def test_element_builders_agree():
+    if truss_module.njit is None:
+        pytest.skip("numba is not installed")
+    args = (rNodes, eNodes.astype(np.int32), elYs, elAs, elDens)
+    jit = truss_module._element_triplets_jit(*args)
+    ref = truss_module._element_triplets_numpy(*args)
+    for a, b in zip(jit[:4], ref[:4]):
+        np.testing.assert_allclose(a, b, rtol=1e-12)
+
+    # Compare the assembled matrices, since triplet ordering may differ
+    shape = (3*len(rNodes), 3*len(rNodes))
+    K_jit = truss_module.sparse.coo_matrix((jit[6], (jit[4], jit[5])), shape=shape)
+    K_ref = truss_module.sparse.coo_matrix((ref[6], (ref[4], ref[5])), shape=shape)
+    np.testing.assert_allclose(K_jit.toarray(), K_ref.toarray(), rtol=1e-12)
+
+def test_stiffness():
+    K, _, _ = dense_reference()
+    t = make_truss()
+    np.testing.assert_allclose(t.stiffness.toarray(), K, rtol=1e-12, atol=1e-12*abs(K).max())
+    np.testing.assert_allclose(t.weight, (t.lengths * elAs * elDens).sum())
+
+def test_upper_triangle_triplets():
+    args = (rNodes, eNodes.astype(np.int32), elYs, elAs, elDens)
+    _, _, _, stiffness_stack, Ig, Jg, Kg = truss_module._element_triplets(*args)
+    assert len(Kg) == 21 * len(eNodes)
+    assert np.all(Ig <= Jg)
+    K, _, _ = dense_reference()
+    np.testing.assert_allclose(make_truss().stiffness.toarray(), K, rtol=1e-12, atol=1e-12*abs(K).max())
+
+@pytest.mark.parametrize("solver", ["direct", "cg", "amg"])
+def test_applyForces(solver):
+    if solver == "amg" and truss_module.pyamg is None:
+        pytest.skip("pyamg is not installed")
+    _, u, f = dense_reference()
+    t = make_truss()
+    t.applyForces(DOF, nFs, solver=solver)
+    np.testing.assert_allclose(t.displacements, u, rtol=1e-7, atol=1e-9*abs(u).max())
+    np.testing.assert_allclose(t.forces, f, rtol=1e-6, atol=1e-6*abs(f).max())
+    np.testing.assert_allclose(t.stresses_el, t.forces_el / elAs)
+
+def test_applyForces_batch():
+    _, u, f = dense_reference()
+    t = make_truss()
+    scales = np.array([1., -2., .5])
+    U, F = t.applyForces_batch(DOF, nFs[:,None] * scales)
+    np.testing.assert_allclose(U, u[:,None] * scales, rtol=1e-9, atol=1e-12*abs(u).max())
+    np.testing.assert_allclose(F, f[:,None] * scales, rtol=1e-9, atol=1e-9*abs(f).max())
+    np.testing.assert_array_equal(t.displacements, 0)
+
+def test_prepare():
+    # Fix an unsorted, non-contiguous set of degrees of freedom
+    fixed = np.array([29, 4, 18, 22, 11, 25, 20, 27, 19, 23, 28, 21, 24, 26])
+    mask = np.ones(3*len(rNodes), dtype=int)
+    mask[fixed] = 0
+    forces = nFs * mask
+    K, u, f = dense_reference(mask, forces)
+    t = make_truss()
+    t.prepare(mask)
+    free = np.flatnonzero(mask)
+    fixed = np.flatnonzero(mask == 0)
+    np.testing.assert_array_equal(t.K_ff.toarray(), t.stiffness[free][:,free].toarray())
+    np.testing.assert_array_equal(t.K_fc.toarray(), t.stiffness[free][:,fixed].toarray())
+    np.testing.assert_allclose(t.K_ff.toarray(), K[np.ix_(free, free)], rtol=1e-12, atol=1e-12*abs(K).max())
+
+    # Solve with the prepared factorization
+    factor = t._factorize(free.astype(np.int32), t.K_ff)
+    t.applyForces(mask, forces)
+    assert t._factorize(free.astype(np.int32), t.K_ff) is factor
+    np.testing.assert_allclose(t.displacements, u, rtol=1e-9, atol=1e-12*abs(u).max())
+    np.testing.assert_allclose(t.forces, f, rtol=1e-9, atol=1e-9*abs(f).max())
+
+def test_validation():
+    nodes = np.eye(3)
+    assert Truss([], [], [], nodes, []).num_elements == 0
+    assert Truss([], [], [], nodes, np.empty((0, 2))).weight == 0
+    for element_nodes in [[[0, 1.5]], [[0, 2**32 + 1]], [[0, -1]], [[0, 1, 2]]]:
+        with pytest.raises(ValueError):
+            Truss([1.], [1.], [1.], nodes, element_nodes)
+    with pytest.raises(ValueError):
+        Truss([1., 1.], [1.], [1.], nodes, [[0, 1]])
@@ -4,10 +4,125 @@ August 2023
 """
 
 import numpy as np
-from numpy import linalg
+from scipy import sparse
+from scipy.sparse.linalg import cg, splu
 
 from bar import Bar
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit, prange = None, range
+
+try:
+    import pyamg
+except ImportError:
+    pyamg = None
+
+def _fill_triplets(node_positions, element_nodes, Youngs, areas, densities,
+                   spans, lengths, weights, stiffness_stack, Ig, Jg, Kg):
+    """Fills per-element geometries & global stiffness COO triplets in place
+
+    Only the upper triangle of the global stiffness is emitted as triplets.
+
+    Args:
+        - node_positions: Node positions, shape (N,3)
+        - element_nodes: Element node indices, shape (nE,2)
+        - Youngs, areas, densities: Bar parameters, shape (nE,)
+        - spans, lengths, weights: Output bar properties, shapes (nE,3) & (nE,)
+        - stiffness_stack: Output element stiffness matrices, shape (nE,6,6)
+        - Ig, Jg, Kg: Output triplet rows, columns & values, shape (21*nE,)
+    """
+    for e in prange(element_nodes.shape[0]):
+        n0 = element_nodes[e,0]
+        n1 = element_nodes[e,1]
+        L2 = 0.
+        for i in range(3):
+            spans[e,i] = node_positions[n1,i] - node_positions[n0,i]
+            L2 += spans[e,i] * spans[e,i]
+        lengths[e] = np.sqrt(L2)
+        weights[e] = lengths[e] * areas[e] * densities[e]
+        C = Youngs[e] * areas[e] / (L2 * lengths[e])
+        for a in range(6):
+            for b in range(6):
+                sign = 1. if a//3 == b//3 else -1.
+                stiffness_stack[e,a,b] = sign * C * spans[e,a%3] * spans[e,b%3]
+
+        # The element stiffness is unchanged by swapping its nodes, so order
+        # them to make the element's upper triangle map to the global one
+        lo = min(n0, n1)
+        hi = max(n0, n1)
+        k = 21*e
+        for a in range(6):
+            for b in range(a, 6):
+                Ig[k] = 3*(lo if a < 3 else hi) + a%3
+                Jg[k] = 3*(lo if b < 3 else hi) + b%3
+                Kg[k] = stiffness_stack[e,a,b]
+                k += 1
+
+def _element_triplets_jit(node_positions, element_nodes, Youngs, areas, densities):
+    """Computes per-element geometries & stiffness triplets with a compiled kernel
+
+    Returns:
+        - spans, lengths, weights, stiffness_stack (nE,6,6), Ig, Jg, Kg
+    """
+    nE = len(element_nodes)
+    spans = np.empty((nE, 3))
+    lengths = np.empty(nE)
+    weights = np.empty(nE)
+    stiffness_stack = np.empty((nE, 6, 6))
+    Ig = np.empty(21*nE, dtype=np.int32)
+    Jg = np.empty(21*nE, dtype=np.int32)
+    Kg = np.empty(21*nE)
+    _fill_triplets(
+        node_positions, element_nodes, Youngs, areas, densities,
+        spans, lengths, weights, stiffness_stack, Ig, Jg, Kg
+    )
+    return spans, lengths, weights, stiffness_stack, Ig, Jg, Kg
+
+def _element_triplets_numpy(node_positions, element_nodes, Youngs, areas, densities):
+    """Computes per-element geometries & stiffness triplets with batched NumPy
+
+    Only the upper triangle of the global stiffness is emitted as triplets.
+
+    Returns:
+        - spans, lengths, weights, stiffness_stack (nE,6,6), Ig, Jg, Kg
+    """
+    nE = len(element_nodes)
+    positions = node_positions[element_nodes]
+    spans = positions[:,1] - positions[:,0]
+    lengths = np.linalg.norm(spans, axis=1)
+    weights = lengths * areas * densities
+    C = Youngs * areas / lengths**3
+    stiffness_stack = np.empty((nE, 6, 6))
+    sub = stiffness_stack[:,:3,:3]
+    np.einsum('ei,ej->eij', spans, spans, out=sub)
+    sub *= C[:,None,None]
+    stiffness_stack[:,3:,3:] = sub
+    np.negative(sub, out=stiffness_stack[:,:3,3:])
+    stiffness_stack[:,3:,:3] = stiffness_stack[:,:3,3:]
+
+    # The element stiffness is unchanged by swapping its nodes, so order
+    # them to make the element's upper triangle map to the global one
+    sorted_nodes = np.sort(element_nodes, axis=1)
+    dofs = (3*sorted_nodes[:,:,None] + np.arange(3, dtype=np.int32)).reshape(nE, 6)
+    iu, ju = np.triu_indices(6)
+    Ig = dofs[:,iu].ravel()
+    Jg = dofs[:,ju].ravel()
+    Kg = stiffness_stack[:,iu,ju].ravel()
+    return spans, lengths, weights, stiffness_stack, Ig, Jg, Kg
+
+def _mirror_upper(K_upper):
+    """Builds the full symmetric CSR matrix from its upper triangle"""
+    return (K_upper + K_upper.T - sparse.diags(K_upper.diagonal())).tocsr()
+
+# Use the compiled kernel when numba is available
+if njit is not None:
+    _fill_triplets = njit(parallel=True, cache=True, fastmath=True)(_fill_triplets)
+    _element_triplets = _element_triplets_jit
+else:
+    _element_triplets = _element_triplets_numpy
+
 class Truss:
     """A truss structure made up of 2-node bar elements.
 
@@ -21,65 +136,191 @@ class Truss:
 
     def __init__(self, Youngs, densities, areas, node_positions, element_nodes):
 
+        # Assign bar parameters as arrays
+        self.Youngs = Youngs = np.asarray(Youngs, dtype=float)
+        self.densities = densities = np.asarray(densities, dtype=float)
+        self.areas = areas = np.asarray(areas, dtype=float)
+
         # Assign node positions
-        self.node_positions = node_positions
+        self.node_positions = np.asarray(node_positions, dtype=float)
         self.num_nodes = len(node_positions)
 
-        # Assign element nodes
-        self.element_nodes = element_nodes
+        # Assign element nodes, treating an empty list as no elements
+        element_nodes = np.asarray(element_nodes)
+        if element_nodes.size == 0:
+            element_nodes = element_nodes.reshape(0, 2)
         self.num_elements = len(element_nodes)
 
+        # Validate input shapes & node indices once, since the batched and
+        # compiled element kernels below do no checking of their own
+        if self.node_positions.ndim != 2 or self.node_positions.shape[1] != 3:
+            raise ValueError("'node_positions' must have shape (num_nodes, 3)")
+        if element_nodes.ndim != 2 or element_nodes.shape[1] != 2:
+            raise ValueError("'element_nodes' must have shape (num_elements, 2)")
+        for name, param in [("Youngs", Youngs), ("densities", densities), ("areas", areas)]:
+            if param.shape != (self.num_elements,):
+                raise ValueError("'{:s}' must have one value per element".format(name))
+        if self.num_elements:
+            integral = np.issubdtype(element_nodes.dtype, np.integer) or (
+                np.issubdtype(element_nodes.dtype, np.floating)
+                and np.all(element_nodes == np.round(element_nodes))
+            )
+            if not integral:
+                raise ValueError("'element_nodes' must be integer node indices")
+            if element_nodes.min() < 0 or element_nodes.max() >= self.num_nodes:
+                raise ValueError("'element_nodes' must index into 'node_positions'")
+        self.element_nodes = element_nodes.astype(np.int32)
+
+        # Compute the truss' extent for setting plot limits
+        self.max_dim = 1.1 * abs(self.node_positions).max()
+
+        # Index each element's global degrees of freedom
+        self._el_dofs = (
+            3*self.element_nodes[:,:,None] + np.arange(3, dtype=np.int32)
+        ).reshape(self.num_elements, 6)
+
         # Initialize node displacements & forces
         self.displacements = np.zeros(3*self.num_nodes)
         self.forces = np.zeros(3*self.num_nodes)
 
-        # Initialize list of bar2 elements
-        self.elements = []
-        for e in range(self.num_elements):
-            ePos = np.array([self.node_positions[n] for n in self.element_nodes[e]])
-            new_bar = Bar(Youngs[e], densities[e], areas[e], ePos)
-            self.elements.append(new_bar)
+        # Compute bar geometries, stiffnesses & global stiffness COO triplets
+        self.element_positions = self.node_positions[self.element_nodes]
+        (self.spans, self.lengths, self.weights, self.stiffness_stack,
+            Ig, Jg, Kg) = _element_triplets(
+            self.node_positions, self.element_nodes, Youngs, areas, densities
+        )
+
+        # Initialize internal element forces & stresses
+        self.forces_el = np.zeros(self.num_elements)
+        self.stresses_el = np.zeros(self.num_elements)
+
+        # Initialize list of bar2 elements as views of the batched arrays
+        self.elements = [Bar(self, e) for e in range(self.num_elements)]
 
         # Compute the truss' weight
-        self.weight = sum([el.weight for el in self.elements])
-
-        # Call compute the truss' global stiffness matrix
-        self.stiffness = np.zeros((3*self.num_nodes, 3*self.num_nodes))
-        for e in range(0,self.num_elements):
-            Ke = self.elements[e].stiffness
-            for i in range(2):
-                ii = self.element_nodes[e,i]
-                for j in range(2):
-                    jj = self.element_nodes[e,j]
-                    Ke_block = Ke[3*i:3*(i+1), 3*j:3*(j+1)]
-                    self.stiffness[3*ii:3*(ii+1), 3*jj:3*(jj+1)] += Ke_block
-        
-    # Apply nodal forces to the truss
-    def applyForces(self, DOF, forces):
-
-        # Modify the stiffness matrix given degrees of freedom
-        Kmod = self.stiffness.copy()
-        Kmod[:, DOF==0] = 0
-        Kmod[DOF==0, :] = 0
-        Kmod[DOF==0, DOF==0] = 1
-
-        # Compute the modified applied force vector
-        Fmod = forces.copy()
-        Fmod[DOF!=0] -= self.stiffness[DOF!=0][:,DOF==0] @ forces[DOF==0]
-
-        # Compute nodal displacements & reaction forces
-        self.displacements = linalg.inv(Kmod) @ Fmod
+        self.weight = self.weights.sum()
+
+        # Assemble the truss' global stiffness matrix from upper triangular
+        # COO triplets, then mirror it into the full symmetric matrix
+        self.stiffness = _mirror_upper(sparse.coo_matrix(
+            (Kg, (Ig, Jg)), shape=(3*self.num_nodes, 3*self.num_nodes)
+        ).tocsr())
+
+    # Global stiffness matrix, the single source for constrained submatrices &
+    # reaction forces; assigning a new one discards cached submatrices & solvers,
+    # but in-place edits are not tracked, so reassign the edited matrix instead
+    @property
+    def stiffness(self):
+        return self._stiffness
+
+    @stiffness.setter
+    def stiffness(self, K):
+        self._stiffness = K
+        self._factor_cache = {}
+
+    # Slice & factorize the constrained stiffness for a set of degrees of
+    # freedom ahead of (repeated) calls to applyForces with the same DOF;
+    # prepare, applyForces & applyForces_batch all expose the constrained
+    # free-free & free-fixed stiffness blocks of their DOF as K_ff & K_fc
+    def prepare(self, DOF):
+        free, fixed = self._partition(DOF)
+        self.K_ff, self.K_fc = K_ff, K_fc = self._submatrices(free, fixed)
+        self._factorize(free, K_ff)
+
+    # Apply nodal forces to the truss, solving for displacements with a sparse
+    # direct factorization ('direct'), Jacobi-preconditioned conjugate gradient
+    # ('cg'), or algebraic multigrid-preconditioned conjugate gradient ('amg')
+    def applyForces(self, DOF, forces, solver='direct'):
+
+        # Check the choice of solver
+        solvers = ['direct', 'cg', 'amg']
+        if solver not in solvers:
+            raise ValueError("'solver' must be one of: " + ", ".join(solvers))
+        if solver == 'amg' and pyamg is None:
+            raise ImportError("The 'amg' solver requires pyamg")
+
+        # Partition the degrees of freedom into free & fixed sets
+        free, fixed = self._partition(DOF)
+
+        # Prescribe nodal displacements on fixed degrees of freedom
+        self.displacements = np.zeros(3*self.num_nodes)
+        self.displacements[fixed] = forces[fixed]
+
+        # Solve for the remaining nodal displacements & compute reaction forces
+        self.K_ff, self.K_fc = K_ff, K_fc = self._submatrices(free, fixed)
+        rhs = forces[free] - K_fc @ self.displacements[fixed]
+        key = (solver, free.tobytes())
+        if solver == 'cg':
+            if key not in self._factor_cache:
+                self._factor_cache[key] = sparse.diags(1 / K_ff.diagonal())
+            M = self._factor_cache[key]
+            self.displacements[free], info = cg(K_ff, rhs, M=M, rtol=1e-9)
+            if info != 0:
+                raise RuntimeError("Conjugate gradient did not converge")
+        elif solver == 'amg':
+            if key not in self._factor_cache:
+                self._factor_cache[key] = pyamg.smoothed_aggregation_solver(K_ff)
+            self.displacements[free], info = self._factor_cache[key].solve(
+                rhs, tol=1e-9, maxiter=1000, accel='cg', return_info=True
+            )
+            if info != 0:
+                raise RuntimeError("AMG-preconditioned conjugate gradient did not converge")
+        else:
+            self.displacements[free] = self._factorize(free, K_ff).solve(rhs)
         self.forces = self.stiffness @ self.displacements
 
-        # Apply nodal displacements to elements
-        for e in range(self.num_elements):
-            inds = np.array([
-                [3*i, 3*i+1, 3*i+2] for i in self.element_nodes[e]
-            ])
-            self.elements[e].apply_disp(self.displacements[inds.flatten()])
+        # Compute internal element forces & stresses all at once
+        el_disps = self.displacements[self._el_dofs]
+        dL = el_disps[:,3:] - el_disps[:,:3]
+        C = self.Youngs * self.areas / self.lengths**2
+        self.forces_el = C * np.einsum('ei,ei->e', self.spans, dL)
+        self.stresses_el = self.forces_el / self.areas
+
+    # Apply several sets of nodal forces (columns of a (3N, nLoads) matrix) to
+    # the truss sharing one factorization, returning nodal displacements &
+    # forces without modifying the truss' displacements & forces
+    def applyForces_batch(self, DOF, forces_matrix):
+
+        # Partition the degrees of freedom into free & fixed sets
+        free, fixed = self._partition(DOF)
+
+        # Prescribe nodal displacements on fixed degrees of freedom
+        displacements = np.zeros(forces_matrix.shape)
+        displacements[fixed] = forces_matrix[fixed]
+
+        # Solve for the remaining nodal displacements & compute reaction forces
+        self.K_ff, self.K_fc = K_ff, K_fc = self._submatrices(free, fixed)
+        rhs = forces_matrix[free] - K_fc @ displacements[fixed]
+        displacements[free] = self._factorize(free, K_ff).solve(rhs)
+        forces = self.stiffness @ displacements
+
+        return displacements, forces
+
+    # Returns indices of free & fixed degrees of freedom
+    def _partition(self, DOF):
+        DOF = np.asarray(DOF)
+        free = np.flatnonzero(DOF != 0).astype(np.int32)
+        fixed = np.flatnonzero(DOF == 0).astype(np.int32)
+        return free, fixed
+
+    # Returns the (cached) free-free & free-fixed blocks of the stiffness matrix
+    def _submatrices(self, free, fixed):
+        key = ('submatrices', free.tobytes())
+        if key not in self._factor_cache:
+            K_free = self.stiffness[free]
+            self._factor_cache[key] = (K_free[:,free], K_free[:,fixed])
+        return self._factor_cache[key]
+
+    # Returns the (cached) sparse LU factorization of the free-DOF stiffness
+    def _factorize(self, free, K_ff):
+        key = ('direct', free.tobytes())
+        if key not in self._factor_cache:
+            self._factor_cache[key] = splu(K_ff.tocsc())
+        return self._factor_cache[key]
 
     # Re-initializes the truss with no nodal displacements
     def reset(self):
         self.displacements = np.zeros(3*self.num_nodes)
         self.forces = np.zeros(3*self.num_nodes)
-        for el in self.elements: el.reset()
+        self.forces_el = np.zeros(self.num_elements)
+        self.stresses_el = np.zeros(self.num_elements)